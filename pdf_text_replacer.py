@@ -5,59 +5,830 @@ A script to replace text in PDF files based on a CSV mapping file.
 Preserves PDF structure and formatting while replacing text content.
 """
 
+import atexit
 import csv
+import multiprocessing
+import re
 import sys
 import os
 import logging
 import argparse
+from logging.handlers import QueueHandler, QueueListener
 from datetime import datetime
 from pathlib import Path
+import tempfile
 import traceback
-from typing import Dict, List, Tuple
+import warnings
+from bisect import bisect_left, bisect_right
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from contextlib import ExitStack
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
 import PyPDF2
 from reportlab.pdfgen import canvas
 from reportlab.lib.pagesizes import letter
 from PyPDF2 import PdfReader, PdfWriter
 import fitz  # PyMuPDF
 
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa = pa_csv = None
+
+try:
+    from tqdm import tqdm
+    from tqdm.contrib.logging import logging_redirect_tqdm
+except ImportError:
+    tqdm = logging_redirect_tqdm = None
+
+logger = logging.getLogger(__name__)
+
+# Default number of worker processes for batch runs
+DEFAULT_WORKERS = min(os.cpu_count() or 1, 4)
+
+# Documents with more pages to process than this are split across worker processes
+PARALLEL_PAGE_THRESHOLD = 50
+
+# Catalog entries of documents that can be split into page ranges (see can_split_pages())
+_SPLIT_CATALOG_KEYS = {"Type", "Pages", "Info", "Metadata", "Outlines", "PageLabels"}
+
+# CSV files larger than this (in bytes) are read with pyarrow when installed
+LARGE_CSV_THRESHOLD = 1 << 20
+
+# Queue that worker processes send their log records to (see setup_logging())
+_log_queue = None
+
+# Replacements and matcher of a worker process, set up once when the
+# process starts (see create_process_pool())
+_worker_replacements: Dict[str, str] = {}
+_worker_matcher = None
+
+
+def setup_logging(log_level: str = 'INFO') -> Path:
+    """
+    Setup logging configuration for the run
+    
+    Call once, before any worker processes are started. Worker processes
+    send their log records back over a queue and the main process writes
+    them, so only one process writes to the log file.
+    
+    Args:
+        log_level: Logging level (DEBUG, INFO, WARNING, ERROR)
+        
+    Returns:
+        Path: Path to the log file
+    """
+    global _log_queue
+    
+    log_filename = f'pdf_replacer_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
+    
+    # Create logs directory if it doesn't exist
+    log_dir = Path('logs')
+    log_dir.mkdir(exist_ok=True)
+    
+    logging.basicConfig(
+        level=getattr(logging, log_level.upper()),
+        format='%(asctime)s - %(levelname)s - %(message)s',
+        handlers=[
+            logging.FileHandler(log_dir / log_filename),
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
+    
+    # Write records from worker processes with the handlers of the main process
+    _log_queue = multiprocessing.Queue()
+    listener = QueueListener(_log_queue, _MainProcessHandler())
+    listener.start()
+    atexit.register(listener.stop)
+    
+    logger.info("Logging initialized. Log file: %s", log_dir / log_filename)
+    return log_dir / log_filename
+
+
+class _MainProcessHandler(logging.Handler):
+    """Hands records received from worker processes to the main process's loggers
+    
+    The handlers are looked up for every record, so records from workers
+    follow changes to them (e.g. logging_redirect_tqdm()).
+    """
+    
+    def emit(self, record: logging.LogRecord) -> None:
+        logging.getLogger(record.name).handle(record)
+
+
+def _init_worker_logging(log_queue, log_level: int) -> None:
+    """Send the log records of a worker process to the main process"""
+    root = logging.getLogger()
+    root.handlers = [QueueHandler(log_queue)]
+    root.setLevel(log_level)
+
+
+def _init_worker(log_queue, log_level: int, replacements: Optional[Dict[str, str]]) -> None:
+    """Set up logging and the matcher of a worker process"""
+    global _worker_replacements, _worker_matcher
+    
+    if log_queue is not None:
+        _init_worker_logging(log_queue, log_level)
+        
+    if replacements is not None:
+        _worker_replacements = replacements
+        _worker_matcher = build_matcher(replacements)
+
+
+def create_process_pool(max_workers: int, replacements: Dict[str, str] = None) -> ProcessPoolExecutor:
+    """
+    Create a pool of worker processes that log through the main process
+    
+    Args:
+        max_workers: Number of worker processes
+        replacements: Mapping of text to find to its replacement, longest keys
+            first; sent once to every worker process, which builds its matcher
+            from it when it starts (optional)
+    """
+    if _log_queue is None and replacements is None:
+        return ProcessPoolExecutor(max_workers=max_workers)
+    return ProcessPoolExecutor(
+        max_workers=max_workers,
+        initializer=_init_worker,
+        initargs=(_log_queue, logging.getLogger().level, replacements)
+    )
+
+
+def sort_longest_first(replacements: Dict[str, str]) -> Dict[str, str]:
+    """Return the replacements ordered by decreasing length of the text to find"""
+    return dict(sorted(replacements.items(), key=lambda item: -len(item[0])))
+
+
+def _fold_case(text: str) -> str:
+    """
+    Lower-case the ASCII letters of text for case-insensitive matching
+    
+    page.search_for() only ignores the case of ASCII letters, so other
+    characters are kept as they are; offsets in the folded text are
+    offsets in the original text. bytes.lower() only changes ASCII bytes,
+    which makes it much faster than str.translate() on non-ASCII text.
+    """
+    return text.encode('utf-8', 'surrogatepass').lower().decode('utf-8', 'surrogatepass')
+
+
+def _collapse_whitespace(text: str) -> str:
+    """Replace every run of whitespace in text with a single space"""
+    return " ".join(text.split())
+
+
+def _folded_items(replacements: Dict[str, str]) -> Dict[str, Tuple[str, str]]:
+    """
+    Return (from_text, to_text) by case-folded key, with runs of whitespace
+    in the key collapsed to a single space
+    
+    Of keys that only differ in case the first one is kept, as that is the
+    one page.search_for() would replace.
+    """
+    items = {}
+    for from_text, to_text in replacements.items():
+        items.setdefault(_collapse_whitespace(_fold_case(from_text)), (from_text, to_text))
+    return items
+
+
+class HyperscanMatcher:
+    """Matches replacement keys with a compiled Hyperscan database
+    
+    Exposes the same iter() interface as ahocorasick.Automaton. Like
+    page.search_for(), the case of ASCII letters is ignored.
+    """
+    
+    def __init__(self, replacements: Dict[str, str]):
+        self.items = tuple(_folded_items(replacements).values())
+        self.database = hyperscan.Database(mode=hyperscan.HS_MODE_BLOCK)
+        self.database.compile(
+            expressions=[_collapse_whitespace(from_text).encode('utf-8') for from_text, _ in self.items],
+            ids=list(range(len(self.items))),
+            flags=hyperscan.HS_FLAG_CASELESS,
+            literal=True
+        )
+        
+    def iter(self, text: str) -> Iterator[Tuple[int, Tuple[str, str]]]:
+        """
+        Yield (index of last character, (from_text, to_text)) for every match in text
+        
+        Like ahocorasick.Automaton.iter(), overlapping matches are all
+        reported; _find_matches_with_matcher() keeps the ones that
+        page.search_for() would find. Keys are matched with whitespace runs
+        collapsed to one space, so text must be collapsed the same way.
+        """
+        data = text.encode('utf-8')
+        hits = []
+        self.database.scan(
+            data,
+            match_event_handler=lambda key_id, start, end, flags, context: hits.append((end, key_id))
+        )
+        
+        if len(data) == len(text):
+            # ASCII only: byte offsets are character offsets
+            for end, key_id in hits:
+                yield end - 1, self.items[key_id]
+            return
+            
+        # Map byte end offsets back to character positions, decoding only
+        # the bytes between consecutive matches
+        position = offset = 0
+        for end, key_id in sorted(hits):
+            position += len(data[offset:end].decode('utf-8'))
+            offset = end
+            yield position - 1, self.items[key_id]
+            
+    def search(self, text: str) -> bool:
+        """Return True if text contains at least one key, stopping at the first match"""
+        try:
+            self.database.scan(text.encode('utf-8'), match_event_handler=lambda *match: True)
+        except hyperscan.ScanTerminated:
+            return True
+        return False
+
+
+class KeyFilter:
+    """Finds which replacement keys occur in a page's text with one regex scan
+    
+    Used when no multi-pattern matching library is installed, to skip
+    page.search_for() calls for keys that do not appear on a page.
+    """
+    
+    def __init__(self, replacements: Dict[str, str]):
+        self.items = tuple(sort_longest_first(replacements).items())
+        # One group per key, longest first; whitespace inside a key may be
+        # any run of whitespace in the extracted text (e.g. a line break).
+        # Keys and text are case-folded, like page.search_for(). The keys are
+        # matched in a lookahead, so every position is tried and keys that
+        # overlap a longer match are found too (a shorter key starting at
+        # the same position lies within the longer one). Without any keys
+        # the pattern must match nothing rather than the empty string
+        alternatives = "|".join(
+            "(" + r"\s+".join(re.escape(part) for part in _fold_case(from_text).split()) + ")"
+            for from_text, _ in self.items
+        )
+        self.pattern = re.compile(f"(?={alternatives})" if alternatives else r"(?!)")
+        
+    def present(self, text: str) -> List[Tuple[str, str]]:
+        """Return the (from_text, to_text) pairs whose key is found in text, longest key first"""
+        found = {match.lastindex - 1 for match in self.pattern.finditer(_fold_case(text))}
+        return [self.items[index] for index in sorted(found)]
+        
+    def search(self, text: str) -> bool:
+        """Return True if text contains at least one key"""
+        return self.pattern.search(_fold_case(text)) is not None
+
+
+def build_matcher(replacements: Dict[str, str]):
+    """
+    Build a multi-pattern matcher for every replacement key
+    
+    Uses pyahocorasick when installed, then Hyperscan, then a KeyFilter
+    that narrows down the keys searched for with page.search_for().
+    pyahocorasick is preferred as it builds far faster for large tables
+    and is as fast on pages with many matches. Every matcher ignores the
+    case of ASCII letters, like page.search_for().
+    
+    Args:
+        replacements: Mapping of text to find to its replacement
+        
+    Returns:
+        ahocorasick.Automaton, HyperscanMatcher or KeyFilter
+    """
+    if not replacements:
+        # Nothing to match; a KeyFilter without keys never matches
+        return KeyFilter(replacements)
+        
+    if ahocorasick is None:
+        if hyperscan is not None:
+            return HyperscanMatcher(replacements)
+        return KeyFilter(replacements)
+        
+    automaton = ahocorasick.Automaton()
+    for key, item in _folded_items(replacements).items():
+        automaton.add_word(key, item)
+    automaton.make_automaton()
+    return automaton
+
+
+def _span_font_size(spans: List[Tuple[fitz.Rect, float]], span_tops: List[float],
+                    max_height: float, rect: fitz.Rect, default: float = 11) -> float:
+    """
+    Return the font size of the span that overlaps rect the most
+    
+    Args:
+        spans: (bbox, font size) of every span on the page, sorted by top edge
+        span_tops: Top edge of every span in spans
+        max_height: Height of the tallest span
+        rect: Area to look up
+        default: Font size returned when no span overlaps rect
+    """
+    # Only spans whose top edge lies within max_height above rect can reach it
+    lo = bisect_left(span_tops, rect.y0 - max_height)
+    hi = bisect_right(span_tops, rect.y1)
+    
+    best_size, best_area = default, 0
+    for span_rect, size in spans[lo:hi]:
+        area = (span_rect & rect).get_area()
+        if area > best_area:
+            best_size, best_area = size, area
+    return best_size
+
+
+def _find_matches_with_search(page: fitz.Page, replacements: Dict[str, str], key_filter: KeyFilter = None,
+                              text: str = None) -> List[Tuple[fitz.Rect, str, float]]:
+    """Find replacements on a page with one page.search_for() call per key present on the page"""
+    # Read the page text once, before any redactions alter it,
+    # and index every span by its position
+    text_dict = page.get_text("dict")
+    spans = sorted(
+        (
+            (fitz.Rect(span["bbox"]), span["size"])
+            for block in text_dict["blocks"] if "lines" in block
+            for line in block["lines"]
+            for span in line["spans"]
+        ),
+        key=lambda span: span[0].y0
+    )
+    span_tops = [span_rect.y0 for span_rect, _ in spans]
+    max_height = max((span_rect.height for span_rect, _ in spans), default=0)
+    matches = []
+    
+    # Only search for the keys that occur in the page text
+    if key_filter is not None:
+        items = key_filter.present(page.get_text("text") if text is None else text)
+    else:
+        items = replacements.items()
+        
+    # Get all text instances on the page
+    debug = logger.isEnabledFor(logging.DEBUG)
+    for from_text, to_text in items:
+        # Search for all instances of the text
+        text_instances = page.search_for(from_text)
+        
+        if text_instances:
+            if debug:
+                logger.debug("Found %d instances of '%s' on page %d",
+                             len(text_instances), from_text, page.number + 1)
+            
+            for inst in text_instances:
+                # Get the font size from the original text at this position
+                font_size = _span_font_size(spans, span_tops, max_height, inst)
+                matches.append((inst, to_text, font_size))
+                
+    return matches
+
+
+def _find_matches_with_matcher(page: fitz.Page, matcher) -> List[Tuple[fitz.Rect, str, float]]:
+    """Find replacements on a page with a single multi-pattern pass over its characters"""
+    # Flatten the page into one string, keeping the bbox and font size
+    # of every character; lines are separated by None entries. Runs of
+    # whitespace become one space, as keys match any run of whitespace
+    # with page.search_for()
+    text = []
+    chars = []
+    for block in page.get_text("rawdict")["blocks"]:
+        for line in block.get("lines", ()):
+            for span in line["spans"]:
+                for char in span["chars"]:
+                    if char["c"].isspace():
+                        if text and text[-1] == " ":
+                            continue
+                        text.append(" ")
+                    else:
+                        text.append(char["c"])
+                    chars.append((char["bbox"], span["size"]))
+            text.append("\n")
+            chars.append(None)
+    full_text = "".join(text)
+    if not isinstance(matcher, HyperscanMatcher):
+        # The automaton holds case-folded keys
+        full_text = _fold_case(full_text)
+        
+    # Like page.search_for(), keep the leftmost non-overlapping matches of
+    # each key, and merge matches of a key that directly follow each other
+    spans = {}
+    key_lengths = {}
+    for end, (from_text, to_text) in sorted(matcher.iter(full_text), key=lambda hit: hit[0]):
+        if from_text not in key_lengths:
+            key_lengths[from_text] = len(_collapse_whitespace(from_text))
+        start = end - key_lengths[from_text] + 1
+        if None in chars[start:end + 1]:
+            # Matches spanning a line break are not replaced
+            continue
+            
+        key_spans = spans.setdefault((from_text, to_text), [])
+        if key_spans and start <= key_spans[-1][1]:
+            continue
+        if key_spans and start == key_spans[-1][1] + 1:
+            key_spans[-1][1] = end
+        else:
+            key_spans.append([start, end])
+            
+    matches = []
+    for (from_text, to_text), key_spans in spans.items():
+        for start, end in key_spans:
+            matched = chars[start:end + 1]
+            rect = fitz.Rect(matched[0][0])
+            for bbox, _ in matched[1:]:
+                rect |= bbox
+            matches.append((key_lengths[from_text], rect, to_text, matched[0][1]))
+            
+    logger.debug("Found %d matches on page %d", len(matches), page.number + 1)
+    
+    # Longest keys first, like the search path
+    matches.sort(key=lambda match: -match[0])
+    return [match[1:] for match in matches]
+
+
+def replace_text_on_page(page: fitz.Page, replacements: Dict[str, str], matcher=None,
+                         text: str = None) -> int:
+    """
+    Replace text on a single PDF page in place
+    
+    Args:
+        page: Page to modify
+        replacements: Mapping of text to find to its replacement, longest
+            keys first (see sort_longest_first())
+        matcher: Matcher from build_matcher() (optional, searches for every
+            key with page.search_for() when not given)
+        text: Plain text of the page, if already extracted (optional, used
+            by a KeyFilter matcher)
+        
+    Returns:
+        int: Number of replacements made on the page
+    """
+    logger.debug("Processing page %d", page.number + 1)
+    
+    if matcher is None or isinstance(matcher, KeyFilter):
+        matches = _find_matches_with_search(page, replacements, matcher, text)
+    else:
+        matches = _find_matches_with_matcher(page, matcher)
+        
+    # Matches come longest key first; skip shorter matches that fall
+    # inside text already claimed by a longer one
+    pending = []
+    claimed = []
+    for inst, to_text, font_size in matches:
+        if any(rect.contains(inst) for rect in claimed):
+            continue
+        claimed.append(inst)
+        pending.append((inst, to_text, font_size))
+        
+    if not pending:
+        return 0
+        
+    # Create redaction annotations to hide the original text
+    for inst, _, _ in pending:
+        page.add_redact_annot(inst, text="")
+        
+    # Apply all redactions on the page at once
+    page.apply_redactions()
+    
+    # Add the replacement text at the same locations, in the standard
+    # Helvetica font, which is referenced by name rather than embedded
+    for inst, to_text, font_size in pending:
+        page.insert_text(inst.bottom_left, to_text, fontname="helv", fontsize=font_size, color=(0, 0, 0))
+        
+    return len(pending)
+
+
+def _text_has_match(text: str, matcher) -> bool:
+    """Return True if text contains at least one key of matcher"""
+    if isinstance(matcher, KeyFilter):
+        return matcher.search(text)
+    
+    # The page is matched with whitespace runs collapsed to one space
+    text = _collapse_whitespace(text)
+    if isinstance(matcher, HyperscanMatcher):
+        return matcher.search(text)
+    return next(iter(matcher.iter(_fold_case(text))), None) is not None
+
+
+def find_pages_with_matches(doc: fitz.Document, matcher) -> Dict[int, str]:
+    """
+    Return the text of the pages that contain at least one key, by page number
+    
+    Plain text extraction is much cheaper than the per-page matching, so
+    this lets pages (and documents) without any replacement be skipped. The
+    text is kept so that it is not extracted again when the page is processed.
+    
+    Args:
+        doc: Document to scan
+        matcher: Matcher from build_matcher()
+    """
+    pages = {}
+    for page in doc:
+        text = page.get_text("text")
+        if _text_has_match(text, matcher):
+            pages[page.number] = text
+    return pages
+
+
+def can_split_pages(doc: fitz.Document) -> bool:
+    """
+    Return True if a document can be split into page ranges and joined again
+    
+    Joining the ranges rebuilds the pages, outline, page labels and metadata
+    of the original document; documents with any other catalog entry (e.g.
+    form fields, named destinations or embedded files) are not split, as
+    that structure would be lost.
+    
+    Args:
+        doc: Document to check
+    """
+    return set(doc.xref_get_keys(doc.pdf_catalog())) <= _SPLIT_CATALOG_KEYS
+
+
+def _process_page_range(input_path: str, page_start: int, page_end: int,
+                        pages: Dict[int, str]) -> Tuple[str, int, List[Tuple[int, dict]]]:
+    """
+    Replace text on pages [page_start, page_end) of a PDF in a worker process
+    
+    Only the pages in pages (text by page number) are processed; the others are
+    copied unchanged. Uses the worker's replacements and matcher (see
+    create_process_pool()).
+    
+    Returns:
+        Tuple[str, int, List[Tuple[int, dict]]]: (Path to a temporary PDF
+            holding the processed pages, Number of replacements made,
+            (page number, link) of every link on the pages that have a link
+            to a page outside the range)
+    """
+    doc = fitz.open(input_path)
+    
+    replacement_count = 0
+    for page_number, text in pages.items():
+        replacement_count += replace_text_on_page(doc[page_number], _worker_replacements, _worker_matcher, text)
+        
+    # Links to pages outside the range are dropped when the other pages are
+    # removed; keep every link of those pages so they can be rebuilt in order
+    links = []
+    for page in doc.pages(page_start, page_end):
+        page_links = page.get_links()
+        if any(link["kind"] == fitz.LINK_GOTO and not page_start <= link["page"] < page_end
+               for link in page_links):
+            links.extend((page.number, link) for link in page_links)
+            
+    doc.select(range(page_start, page_end))
+    
+    fd, temp_path = tempfile.mkstemp(suffix=".pdf")
+    os.close(fd)
+    doc.save(temp_path)
+    doc.close()
+    
+    return temp_path, replacement_count, links
+
+
+def _replace_text_in_page_ranges(doc: fitz.Document, input_path: str, replacements: Dict[str, str],
+                                 pages: Dict[int, str], workers: int) -> Tuple[fitz.Document, int]:
+    """
+    Split a document into page ranges, process the listed pages of each
+    range in worker processes and join the results into a new document
+    
+    Processes are used rather than threads: PyMuPDF is not thread-safe and
+    keeps the GIL during MuPDF calls, so threads sharing one document can
+    corrupt it without running any faster. Only documents accepted by
+    can_split_pages() are split.
+    
+    Returns:
+        Tuple[fitz.Document, int]: (Joined document, Number of replacements made)
+    """
+    page_count = len(doc)
+    chunk_size = -(-page_count // workers)
+    ranges = [(start, min(start + chunk_size, page_count))
+              for start in range(0, page_count, chunk_size)]
+    
+    logger.info("Processing %d pages in %d worker processes", page_count, len(ranges))
+    
+    with create_process_pool(len(ranges), replacements) as executor:
+        futures = [
+            executor.submit(_process_page_range, input_path, start, end,
+                            {number: text for number, text in pages.items() if start <= number < end})
+            for start, end in ranges
+        ]
+        
+    try:
+        results = [future.result() for future in futures]
+        
+        out = fitz.open()
+        for temp_path, _, _ in results:
+            with fitz.open(temp_path) as part:
+                out.insert_pdf(part)
+                
+        # Rebuild the links that crossed page ranges
+        for _, _, links in results:
+            for page_number in {page_number for page_number, _ in links}:
+                page = out[page_number]
+                for link in page.get_links():
+                    page.delete_link(link)
+            for page_number, link in links:
+                out[page_number].insert_link(link)
+                
+        out.set_metadata(doc.metadata)
+        toc = doc.get_toc(simple=False)
+        out.set_toc(toc)
+        # set_toc() gives every item the same open state; restore each one
+        # (an outline item is shown collapsed when its /Count is negative)
+        for (*_, dest), (*_, out_dest) in zip(toc, out.get_toc(simple=False)):
+            count_type, count = out.xref_get_key(out_dest["xref"], "Count")
+            if count_type == "int" and "collapse" in dest:
+                count = abs(int(count))
+                out.xref_set_key(out_dest["xref"], "Count", str(-count if dest["collapse"] else count))
+                
+        out.set_page_labels(doc.get_page_labels())
+        xml_metadata = doc.get_xml_metadata()
+        if xml_metadata:
+            out.set_xml_metadata(xml_metadata)
+            
+        return out, sum(count for _, count, _ in results)
+        
+    finally:
+        # Remove the temporary PDFs of every range that completed
+        for future in futures:
+            if future.exception() is None:
+                os.remove(future.result()[0])
+
+
+def save_document(doc: fitz.Document, output_path: str, compact: bool = False,
+                  modified: bool = True) -> None:
+    """
+    Save a modified PDF
+    
+    Embedded fonts of a modified document are subset to the glyphs still
+    used, so redacted text does not leave whole font programs behind. By
+    default the document is then written as fast as possible, without
+    garbage collection or compression. With compact, unused objects are
+    also removed, duplicates merged and streams compressed; this is slower
+    but gives much smaller files.
+    
+    Saving over the file the document was opened from is done incrementally,
+    which only appends the changes (and cannot be compacted). Documents that
+    cannot be saved incrementally (once text has been redacted, or when they
+    were repaired on opening) are written in full to a temporary file that
+    then replaces the original.
+    
+    Args:
+        doc: Document to save
+        output_path: Path to output PDF file
+        compact: Optimize for file size instead of speed (optional, defaults to False)
+        modified: Whether any text was replaced; fonts are only subset when
+            it was (optional, defaults to True)
+    """
+    in_place = bool(doc.name) and os.path.abspath(doc.name) == os.path.abspath(output_path)
+    if in_place and doc.can_save_incrementally():
+        if compact:
+            logger.warning("Saving %s in place incrementally, compact output is not applied", output_path)
+        doc.save(output_path, incremental=True, encryption=fitz.PDF_ENCRYPT_KEEP)
+        return
+        
+    save_path = output_path
+    if in_place:
+        fd, save_path = tempfile.mkstemp(suffix=".pdf", dir=os.path.dirname(os.path.abspath(output_path)))
+        os.close(fd)
+        
+    try:
+        if modified:
+            doc.subset_fonts()
+            
+        if compact:
+            doc.ez_save(save_path, garbage=4, clean=True)
+        else:
+            doc.save(save_path, garbage=0, deflate=False)
+            
+        if in_place:
+            os.replace(save_path, output_path)
+            
+    except Exception:
+        if in_place and os.path.exists(save_path):
+            os.remove(save_path)
+        raise
+
+
+def replace_text_in_pdf(input_path: str, output_path: str, replacements: Dict[str, str],
+                        workers: int = 1, matcher=None, compact: bool = False) -> Tuple[bool, int]:
+    """
+    Replace text in a PDF file using PyMuPDF
+    
+    Args:
+        input_path: Path to input PDF file
+        output_path: Path to output PDF file
+        replacements: Mapping of text to find to its replacement; when a
+            matcher is given it must be ordered longest key first (see
+            sort_longest_first())
+        workers: Number of worker processes for documents with more than
+            PARALLEL_PAGE_THRESHOLD pages to process (optional, defaults to 1)
+        matcher: Matcher from build_matcher() (optional, built from
+            replacements, after sorting them, when not given)
+        compact: Save for file size instead of speed (optional, defaults to False)
+        
+    Returns:
+        Tuple[bool, int]: (Success status, Number of replacements made)
+    """
+    try:
+        if not os.path.exists(input_path):
+            logger.error("Input PDF not found: %s", input_path)
+            return False, 0
+            
+        # Open the PDF
+        doc = fitz.open(input_path)
+        replacement_count = 0
+        
+        logger.info("Processing PDF: %s", input_path)
+        logger.info("Number of pages: %d", len(doc))
+        
+        if matcher is None:
+            replacements = sort_longest_first(replacements)
+            matcher = build_matcher(replacements)
+            
+        # Only pages containing at least one key need processing
+        pages = find_pages_with_matches(doc, matcher)
+        logger.debug("Pages with replacement text: %d of %d", len(pages), len(doc))
+        
+        if not pages:
+            logger.info("No replacement text found in %s", input_path)
+        elif workers > 1 and len(pages) > PARALLEL_PAGE_THRESHOLD and can_split_pages(doc):
+            # Large document: process page ranges in parallel
+            out, replacement_count = _replace_text_in_page_ranges(doc, input_path, replacements,
+                                                                  pages, workers)
+            doc.close()
+            doc = out
+        else:
+            # Process each page
+            for page_number, text in pages.items():
+                replacement_count += replace_text_on_page(doc[page_number], replacements, matcher, text)
+                
+        # Save the modified PDF
+        save_document(doc, output_path, compact, modified=replacement_count > 0)
+        doc.close()
+        
+        logger.info("Successfully created output PDF: %s", output_path)
+        logger.info("Total replacements made: %d", replacement_count)
+        
+        return True, replacement_count
+        
+    except Exception as e:
+        logger.error("Error processing PDF: %s", e)
+        logger.debug(traceback.format_exc())
+        return False, 0
+
+
+def default_output_path(input_path: str) -> Path:
+    """Return the default output path for a PDF (input_replaced.pdf next to the input)"""
+    input_file = Path(input_path)
+    return input_file.parent / f"{input_file.stem}_replaced{input_file.suffix}"
+
+
+def _replace_text_worker(job: Tuple[str, str, bool]) -> Tuple[bool, int]:
+    """Run replace_text_in_pdf for one (input, output, compact) job in a worker process"""
+    input_path, output_path, compact = job
+    return replace_text_in_pdf(input_path, output_path, _worker_replacements,
+                               matcher=_worker_matcher, compact=compact)
+
+
+def _job_result(future: Future, input_path: str) -> Tuple[bool, int]:
+    """Return the result of a finished job, or a failure if its worker process failed"""
+    try:
+        return future.result()
+    except Exception as e:
+        logger.error("Worker process failed on %s: %s", input_path, e)
+        return False, 0
+
 
 class PDFTextReplacer:
     """Handles PDF text replacement operations"""
     
-    def __init__(self, csv_path: str, log_level: str = 'INFO'):
+    def __init__(self, csv_path: str, log_level: str = None, *, compact: bool = False):
         """
         Initialize the PDF Text Replacer
         
+        Logging is configured separately, once per run, with setup_logging().
+        
         Args:
             csv_path: Path to CSV file containing replacements
-            log_level: Logging level (DEBUG, INFO, WARNING, ERROR)
+            log_level: Deprecated and ignored; pass the level to setup_logging()
+            compact: Save output PDFs for file size instead of speed
         """
+        if log_level is not None:
+            warnings.warn("PDFTextReplacer(log_level=...) is ignored; call setup_logging(log_level) instead",
+                          DeprecationWarning, stacklevel=2)
+            
         self.csv_path = csv_path
+        self.compact = compact
         self.replacements = {}
+        self.matcher = None
         self.processed_files = 0
         self.total_replacements = 0
-        
-        # Setup logging
-        self.setup_logging(log_level)
-        
-    def setup_logging(self, log_level: str):
-        """Setup logging configuration"""
-        log_filename = f'pdf_replacer_{datetime.now().strftime("%Y%m%d_%H%M%S")}.log'
-        
-        # Create logs directory if it doesn't exist
-        log_dir = Path('logs')
-        log_dir.mkdir(exist_ok=True)
-        
-        logging.basicConfig(
-            level=getattr(logging, log_level.upper()),
-            format='%(asctime)s - %(levelname)s - %(message)s',
-            handlers=[
-                logging.FileHandler(log_dir / log_filename),
-                logging.StreamHandler(sys.stdout)
-            ]
-        )
-        self.logger = logging.getLogger(__name__)
-        self.logger.info(f"Logging initialized. Log file: {log_dir / log_filename}")
+        self.logger = logger
         
     def load_csv_mappings(self) -> bool:
         """
@@ -68,179 +839,223 @@ class PDFTextReplacer:
         """
         try:
             if not os.path.exists(self.csv_path):
-                self.logger.error(f"CSV file not found: {self.csv_path}")
+                self.logger.error("CSV file not found: %s", self.csv_path)
                 return False
                 
-            with open(self.csv_path, 'r', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                
-                # Validate CSV headers
-                if 'from' not in reader.fieldnames or 'to' not in reader.fieldnames:
-                    self.logger.error("CSV must have 'from' and 'to' columns")
-                    return False
-                
+            large_file = os.path.getsize(self.csv_path) > LARGE_CSV_THRESHOLD
+            rows = self._read_rows_with_pyarrow() if large_file else None
+            
+            with ExitStack() as stack:
+                if rows is None:
+                    csvfile = stack.enter_context(open(self.csv_path, 'r', encoding='utf-8'))
+                    reader = csv.reader(csvfile)
+                    header = next(reader, [])
+                    
+                    # Validate CSV headers
+                    if 'from' not in header or 'to' not in header:
+                        self.logger.error("CSV must have 'from' and 'to' columns")
+                        return False
+                    from_index = header.index('from')
+                    to_index = header.index('to')
+                    
+                    rows = (
+                        (row[from_index] if from_index < len(row) else '',
+                         row[to_index] if to_index < len(row) else '')
+                        for row in reader if row
+                    )
+                    
                 # Load replacements
-                for row_num, row in enumerate(reader, start=2):
-                    from_text = row.get('from', '').strip()
-                    to_text = row.get('to', '').strip()
+                for row_num, (from_text, to_text) in enumerate(rows, start=2):
+                    from_text = from_text.strip()
+                    to_text = to_text.strip()
                     
                     if not from_text:
-                        self.logger.warning(f"Empty 'from' value in row {row_num}, skipping")
+                        self.logger.warning("Empty 'from' value in row %d, skipping", row_num)
                         continue
                         
                     if from_text in self.replacements:
-                        self.logger.warning(f"Duplicate 'from' value '{from_text}' in row {row_num}")
+                        self.logger.warning("Duplicate 'from' value '%s' in row %d", from_text, row_num)
                         
-                    self.replacements[from_text] = to_text
+                    self.replacements[sys.intern(from_text)] = to_text
                     
-                self.logger.info(f"Loaded {len(self.replacements)} replacement mappings")
+                self.logger.info("Loaded %d replacement mappings", len(self.replacements))
                 
                 if not self.replacements:
                     self.logger.warning("No valid replacements found in CSV")
                     return False
                     
+                # Order longest keys first and build the matcher once; documents are
+                # processed with both, so replace_text_in_pdf() does not sort again
+                self.replacements = sort_longest_first(self.replacements)
+                self.matcher = build_matcher(self.replacements)
+                if isinstance(self.matcher, KeyFilter):
+                    self.logger.info("Neither hyperscan nor pyahocorasick is installed, falling back to per-key search")
+                    
                 return True
                 
         except Exception as e:
-            self.logger.error(f"Error loading CSV file: {str(e)}")
+            self.logger.error("Error loading CSV file: %s", e)
             self.logger.debug(traceback.format_exc())
             return False
             
-    def replace_text_in_pdf(self, input_path: str, output_path: str) -> Tuple[bool, int]:
+    def _read_rows_with_pyarrow(self) -> Optional[Iterable[Tuple[str, str]]]:
+        """
+        Read the 'from' and 'to' columns with pyarrow's multi-threaded CSV reader
+        
+        Returns:
+            Iterable of (from, to) values, or None if pyarrow is not installed
+            or cannot read the file (e.g. rows with extra columns), in which
+            case the standard csv module is used instead
+        """
+        if pa_csv is None:
+            return None
+            
+        try:
+            table = pa_csv.read_csv(
+                self.csv_path,
+                read_options=pa_csv.ReadOptions(use_threads=True),
+                parse_options=pa_csv.ParseOptions(newlines_in_values=True),
+                convert_options=pa_csv.ConvertOptions(
+                    include_columns=['from', 'to'],
+                    column_types={'from': pa.string(), 'to': pa.string()},
+                    strings_can_be_null=False,
+                    quoted_strings_can_be_null=False
+                )
+            )
+        except pa.ArrowException as e:
+            self.logger.debug("pyarrow could not read the CSV file (%s), using the csv module", e)
+            return None
+            
+        return zip(table['from'].to_pylist(), table['to'].to_pylist())
+        
+    def replace_text_in_pdf(self, input_path: str, output_path: str, workers: int = 1) -> Tuple[bool, int]:
         """
         Replace text in a PDF file using PyMuPDF
         
         Args:
             input_path: Path to input PDF file
             output_path: Path to output PDF file
+            workers: Number of worker processes for large documents (optional, defaults to 1)
             
         Returns:
             Tuple[bool, int]: (Success status, Number of replacements made)
         """
-        try:
-            if not os.path.exists(input_path):
-                self.logger.error(f"Input PDF not found: {input_path}")
-                return False, 0
-                
-            # Open the PDF
-            doc = fitz.open(input_path)
-            replacement_count = 0
-            
-            self.logger.info(f"Processing PDF: {input_path}")
-            self.logger.info(f"Number of pages: {len(doc)}")
-            
-            # Process each page
-            for page_num, page in enumerate(doc):
-                self.logger.debug(f"Processing page {page_num + 1}")
-                
-                # Get all text instances on the page
-                for from_text, to_text in self.replacements.items():
-                    # Search for all instances of the text
-                    text_instances = page.search_for(from_text)
-                    
-                    if text_instances:
-                        self.logger.debug(f"Found {len(text_instances)} instances of '{from_text}' on page {page_num + 1}")
-                        
-                        for inst in text_instances:
-                            # Create a redaction annotation to hide the original text
-                            page.add_redact_annot(inst, text="")
-                            
-                            # Apply the redaction
-                            page.apply_redactions()
-                            
-                            # Add the replacement text at the same location
-                            # Get the font size from the original text
-                            text_dict = page.get_text("dict")
-                            font_size = 11  # Default font size
-                            
-                            # Try to get the original font size
-                            for block in text_dict["blocks"]:
-                                if "lines" in block:
-                                    for line in block["lines"]:
-                                        for span in line["spans"]:
-                                            if from_text in span["text"]:
-                                                font_size = span["size"]
-                                                break
-                            
-                            # Insert the replacement text
-                            page.insert_text(
-                                inst.bottom_left,
-                                to_text,
-                                fontsize=font_size,
-                                color=(0, 0, 0)
-                            )
-                            replacement_count += 1
-                            
-            # Save the modified PDF
-            doc.save(output_path)
-            doc.close()
-            
-            self.logger.info(f"Successfully created output PDF: {output_path}")
-            self.logger.info(f"Total replacements made: {replacement_count}")
-            
-            return True, replacement_count
-            
-        except Exception as e:
-            self.logger.error(f"Error processing PDF: {str(e)}")
-            self.logger.debug(traceback.format_exc())
-            return False, 0
-            
-    def process_pdf_file(self, input_path: str, output_path: str = None) -> bool:
+        return replace_text_in_pdf(input_path, output_path, self.replacements, workers,
+                                   self.matcher, self.compact)
+        
+    def process_pdf_file(self, input_path: str, output_path: str = None, workers: int = 1) -> bool:
         """
         Process a single PDF file
         
         Args:
             input_path: Path to input PDF
             output_path: Path to output PDF (optional, defaults to input_replaced.pdf)
+            workers: Number of worker processes for large documents (optional, defaults to 1)
             
         Returns:
             bool: True if successful
         """
         if not output_path:
-            input_file = Path(input_path)
-            output_path = input_file.parent / f"{input_file.stem}_replaced{input_file.suffix}"
+            output_path = default_output_path(input_path)
             
         print(f"\n{'='*60}")
         print(f"Processing: {input_path}")
         print(f"Output: {output_path}")
         print(f"{'='*60}")
         
-        success, count = self.replace_text_in_pdf(input_path, output_path)
+        success, count = self.replace_text_in_pdf(input_path, output_path, workers)
+        self.record_result(success, count)
         
         if success:
-            self.processed_files += 1
-            self.total_replacements += count
             print(f"✓ Success! Made {count} replacements")
         else:
             print(f"✗ Failed to process file")
             
         return success
         
-    def process_multiple_pdfs(self, pdf_files: List[str], output_dir: str = None) -> None:
+    def record_result(self, success: bool, count: int) -> None:
+        """
+        Update the run totals with the outcome of one file
+        
+        Args:
+            success: Whether the file was processed successfully
+            count: Number of replacements made in the file
+        """
+        if success:
+            self.processed_files += 1
+            self.total_replacements += count
+        
+    def process_multiple_pdfs(self, pdf_files: List[str], output_dir: str = None,
+                              workers: int = None,
+                              progress_callback: Callable[[int, int, str, bool], None] = None) -> None:
         """
         Process multiple PDF files
         
+        Files are independent of each other, so they are spread across a pool
+        of worker processes. Progress is shown as a single progress bar when
+        tqdm is installed, and as one line per file otherwise.
+        
         Args:
             pdf_files: List of PDF file paths
             output_dir: Output directory (optional)
+            workers: Number of worker processes (optional, defaults to DEFAULT_WORKERS)
+            progress_callback: Called as progress_callback(done, total, pdf_file, success)
+                each time a file finishes (optional)
         """
         total_files = len(pdf_files)
         print(f"\nProcessing {total_files} PDF files...")
         
+        if workers is None:
+            workers = DEFAULT_WORKERS
+            
         if output_dir:
             output_path = Path(output_dir)
             output_path.mkdir(exist_ok=True)
             
-        for idx, pdf_file in enumerate(pdf_files, 1):
-            print(f"\nFile {idx}/{total_files}")
-            
+        jobs = []
+        for pdf_file in pdf_files:
             if output_dir:
                 output_file = output_path / f"{Path(pdf_file).stem}_replaced.pdf"
             else:
-                output_file = None
-                
-            self.process_pdf_file(pdf_file, output_file)
+                output_file = default_output_path(pdf_file)
+            jobs.append((pdf_file, str(output_file), self.compact))
             
+        with ExitStack() as stack:
+            progress = None
+            if tqdm is not None:
+                progress = stack.enter_context(tqdm(total=total_files, unit="pdf"))
+                # Print log messages above the progress bar rather than through it
+                stack.enter_context(logging_redirect_tqdm())
+                
+            if workers <= 1 or total_files <= 1:
+                results = (
+                    (job, self.replace_text_in_pdf(job[0], job[1], workers))
+                    for job in jobs
+                )
+            else:
+                self.logger.info("Processing with %d worker processes", min(workers, total_files))
+                # Each worker receives the replacements and builds its matcher once
+                executor = stack.enter_context(create_process_pool(min(workers, total_files), self.replacements))
+                futures = {executor.submit(_replace_text_worker, job): job for job in jobs}
+                results = (
+                    (futures[future], _job_result(future, futures[future][0]))
+                    for future in as_completed(futures)
+                )
+                
+            for idx, ((pdf_file, output_file, *_), (success, count)) in enumerate(results, 1):
+                self.record_result(success, count)
+                
+                if progress is not None:
+                    progress.update()
+                    progress.set_postfix(replacements=self.total_replacements, ok=self.processed_files)
+                elif success:
+                    print(f"File {idx}/{total_files}: ✓ {pdf_file} -> {output_file} ({count} replacements)")
+                else:
+                    print(f"File {idx}/{total_files}: ✗ Failed to process {pdf_file}")
+                    
+                if progress_callback:
+                    progress_callback(idx, total_files, pdf_file, success)
+                    
         # Summary
         print(f"\n{'='*60}")
         print(f"SUMMARY")
@@ -278,11 +1093,18 @@ CSV Format:
     parser.add_argument('-l', '--log-level', default='INFO',
                         choices=['DEBUG', 'INFO', 'WARNING', 'ERROR'],
                         help='Logging level (default: INFO)')
+    parser.add_argument('-c', '--compact', action='store_true',
+                        help='Compress and garbage-collect output PDFs (smaller files, slower saves)')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Number of worker processes for multiple files or large PDFs (default: {DEFAULT_WORKERS})')
     
     args = parser.parse_args()
     
     # Create replacer instance
-    replacer = PDFTextReplacer(args.csv_file, args.log_level)
+    # Setup logging once, before any worker processes are started
+    setup_logging(args.log_level)
+    
+    replacer = PDFTextReplacer(args.csv_file, compact=args.compact)
     
     # Load CSV mappings
     print(f"Loading replacements from: {args.csv_file}")
@@ -300,12 +1122,12 @@ CSV Format:
     # Process PDF files
     if len(args.pdf_files) == 1 and not args.output_dir:
         # Single file
-        replacer.process_pdf_file(args.pdf_files[0], args.output)
+        replacer.process_pdf_file(args.pdf_files[0], args.output, args.workers)
     else:
         # Multiple files
         if args.output and len(args.pdf_files) > 1:
             print("Warning: -o/--output is ignored when processing multiple files")
-        replacer.process_multiple_pdfs(args.pdf_files, args.output_dir)
+        replacer.process_multiple_pdfs(args.pdf_files, args.output_dir, args.workers)
 
 
 if __name__ == "__main__":
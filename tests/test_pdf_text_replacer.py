@@ -0,0 +1,420 @@
+"""Behavioural tests for pdf_text_replacer"""
+
+import os
+
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("PyPDF2")
+pytest.importorskip("reportlab")
+
+import pdf_text_replacer
+
+
+REPLACEMENTS = {"Company A": "Acme Inc", "DRAFT": "FINAL"}
+
+
+def make_pdf(path, page_count=3):
+    """Write a PDF with replaceable text on every page and return its path"""
+    doc = fitz.open()
+    for number in range(page_count):
+        page = doc.new_page()
+        page.insert_text((72, 72), f"Company A report page {number + 1}", fontsize=14)
+        page.insert_text((72, 100), "Contact Company and DRAFT copy", fontsize=10)
+    doc.save(path)
+    doc.close()
+    return str(path)
+
+
+def page_texts(path):
+    with fitz.open(path) as doc:
+        return [page.get_text("text") for page in doc]
+
+
+def page_links(path):
+    """Return the links of every page, without their object numbers"""
+    with fitz.open(path) as doc:
+        return [
+            [{key: value for key, value in link.items() if key not in ("xref", "id")}
+             for link in page.get_links()]
+            for page in doc
+        ]
+
+
+def outline(doc):
+    """Return the full outline of a document, without object numbers"""
+    return [
+        [*entry, {key: value for key, value in dest.items() if key != "xref"}]
+        for *entry, dest in doc.get_toc(simple=False)
+    ]
+
+
+@pytest.fixture(params=["hyperscan", "ahocorasick", "keyfilter"])
+def backend(request, monkeypatch):
+    """Make build_matcher() use one matching backend"""
+    for name in ("hyperscan", "ahocorasick"):
+        if name != request.param:
+            monkeypatch.setattr(pdf_text_replacer, name, None)
+    if request.param != "keyfilter" and getattr(pdf_text_replacer, request.param) is None:
+        pytest.skip(f"{request.param} is not installed")
+    return request.param
+
+
+def make_text_pdf(path, lines):
+    """Write a one-page PDF with one line of text per entry and return its path"""
+    doc = fitz.open()
+    page = doc.new_page()
+    for number, line in enumerate(lines):
+        page.insert_text((72, 72 + 30 * number), line, fontsize=12)
+    doc.save(path)
+    doc.close()
+    return str(path)
+
+
+def test_page_ranges_match_serial_output(tmp_path, monkeypatch, backend):
+    monkeypatch.setattr(pdf_text_replacer, "PARALLEL_PAGE_THRESHOLD", 2)
+    
+    doc = fitz.open(make_pdf(tmp_path / "input.pdf", page_count=12))
+    doc[0].insert_link({"kind": fitz.LINK_GOTO, "from": fitz.Rect(72, 200, 200, 220),
+                        "page": 10, "to": fitz.Point(72, 72)})
+    doc[0].insert_link({"kind": fitz.LINK_GOTO, "from": fitz.Rect(72, 230, 200, 250),
+                        "page": 1, "to": fitz.Point(72, 72)})
+    doc[0].insert_link({"kind": fitz.LINK_URI, "from": fitz.Rect(72, 260, 200, 280),
+                        "uri": "https://example.com"})
+    doc[6].insert_link({"kind": fitz.LINK_GOTO, "from": fitz.Rect(72, 200, 200, 220),
+                        "page": 2, "to": fitz.Point(72, 72)})
+    doc.set_page_labels([{"startpage": 0, "prefix": "P-", "style": "D", "firstpagenum": 1}])
+    doc.set_toc([
+        [1, "Start", 1, {"kind": fitz.LINK_GOTO, "page": 0, "to": fitz.Point(72, 500),
+                         "color": (1, 0, 0), "bold": True}],
+        [2, "Web", -1, {"kind": fitz.LINK_URI, "uri": "https://example.com"}],
+        [1, "Middle", 6],
+        [2, "Detail", 7],
+        [1, "End", 12],
+    ])
+    # Leave "Start" open and "Middle" collapsed
+    toc = doc.get_toc(simple=False)
+    doc.xref_set_key(toc[0][3]["xref"], "Count", "1")
+    doc.xref_set_key(toc[2][3]["xref"], "Count", "-1")
+    input_path = str(tmp_path / "linked.pdf")
+    doc.save(input_path)
+    doc.close()
+    
+    serial = str(tmp_path / "serial.pdf")
+    parallel = str(tmp_path / "parallel.pdf")
+    serial_result = pdf_text_replacer.replace_text_in_pdf(input_path, serial, REPLACEMENTS)
+    assert serial_result[0] and serial_result[1] > 0
+    assert pdf_text_replacer.replace_text_in_pdf(input_path, parallel, REPLACEMENTS, workers=3) == serial_result
+    
+    assert page_texts(parallel) == page_texts(serial)
+    assert page_links(parallel) == page_links(serial)
+    with fitz.open(serial) as serial_doc, fitz.open(parallel) as parallel_doc:
+        assert parallel_doc.get_page_labels() == serial_doc.get_page_labels()
+        assert outline(parallel_doc) == outline(serial_doc)
+        assert [dest.get("collapse") for *_, dest in outline(serial_doc)] == [False, None, True, None, None]
+
+
+def test_documents_with_forms_are_not_split(tmp_path):
+    doc = fitz.open(make_pdf(tmp_path / "input.pdf"))
+    assert pdf_text_replacer.can_split_pages(doc)
+    
+    widget = fitz.Widget()
+    widget.field_name = "name"
+    widget.field_type = fitz.PDF_WIDGET_TYPE_TEXT
+    widget.rect = fitz.Rect(300, 300, 400, 320)
+    doc[0].add_widget(widget)
+    assert not pdf_text_replacer.can_split_pages(doc)
+
+
+def test_matching_ignores_case(tmp_path, backend):
+    input_path = make_text_pdf(tmp_path / "input.pdf", ["Company A", "company a", "COMPANY A"])
+    output_path = str(tmp_path / "output.pdf")
+    
+    assert pdf_text_replacer.replace_text_in_pdf(input_path, output_path, REPLACEMENTS) == (True, 3)
+    assert "company" not in page_texts(output_path)[0].lower()
+
+
+def test_empty_replacements_copy_the_document(tmp_path, backend):
+    input_path = make_pdf(tmp_path / "input.pdf")
+    output_path = str(tmp_path / "output.pdf")
+    
+    assert pdf_text_replacer.replace_text_in_pdf(input_path, output_path, {}) == (True, 0)
+    assert page_texts(output_path) == page_texts(input_path)
+    
+    replacer = pdf_text_replacer.PDFTextReplacer(str(tmp_path / "unused.csv"))
+    assert replacer.replace_text_in_pdf(input_path, output_path) == (True, 0)
+
+
+CSV_TEXT = (
+    'from,to\n'
+    'old text,new text\n'
+    '"old, text","new, text"\n'
+    '" Company A ",Acme Inc\n'
+    'Café,Tea room\n'
+    '"two\nlines",one line\n'
+    ',skipped\n'
+    'old text,newer text\n'
+)
+
+
+@pytest.mark.parametrize("csv_text", [CSV_TEXT, CSV_TEXT + "extra,columns,here\n"],
+                         ids=["regular", "ragged"])
+def test_csv_readers_load_the_same_mapping(tmp_path, monkeypatch, csv_text):
+    csv_path = tmp_path / "replacements.csv"
+    csv_path.write_text(csv_text, encoding="utf-8")
+    
+    plain = pdf_text_replacer.PDFTextReplacer(str(csv_path))
+    assert plain.load_csv_mappings()
+    
+    if pdf_text_replacer.pa_csv is None:
+        pytest.skip("pyarrow is not installed")
+    monkeypatch.setattr(pdf_text_replacer, "LARGE_CSV_THRESHOLD", 0)
+    arrow = pdf_text_replacer.PDFTextReplacer(str(csv_path))
+    assert arrow.load_csv_mappings()
+    
+    assert list(arrow.replacements.items()) == list(plain.replacements.items())
+    assert plain.replacements["old text"] == "newer text"
+    assert plain.replacements["Company A"] == "Acme Inc"
+
+
+def test_backends_match_per_key_search(tmp_path, backend):
+    replacements = pdf_text_replacer.sort_longest_first({
+        "Café Crème": "Tea room",
+        "naïve": "simple",
+        "Société Générale": "Bank",
+        "DRAFT": "FINAL",
+        "ana": "X",
+        "11": "Z",
+        "Company A": "Acme Inc",
+    })
+    input_path = make_text_pdf(tmp_path / "input.pdf", [
+        "Le Café Crème est naïve",
+        "SOCIÉTÉ GÉNÉRALE et société générale",
+        "Ünïcode DRAFT, draft and Draft",
+        "banana and 1111, 11 11",
+        "Company   A and COMPANY  A",
+    ])
+    expected_path = str(tmp_path / "expected.pdf")
+    output_path = str(tmp_path / "output.pdf")
+    
+    expected = pdf_text_replacer.replace_text_in_pdf(
+        input_path, expected_path, replacements, matcher=pdf_text_replacer.KeyFilter(replacements))
+    assert expected[1] > 0
+    
+    assert pdf_text_replacer.replace_text_in_pdf(input_path, output_path, replacements) == expected
+    assert page_texts(output_path) == page_texts(expected_path)
+
+
+def test_hyperscan_reports_character_offsets():
+    if pdf_text_replacer.hyperscan is None:
+        pytest.skip("hyperscan is not installed")
+    matcher = pdf_text_replacer.HyperscanMatcher({"Café": "Tea", "DRAFT": "FINAL"})
+    text = "ünïcode café and draft, café"
+    
+    assert sorted(matcher.iter(text)) == [
+        (11, ("Café", "Tea")),
+        (21, ("DRAFT", "FINAL")),
+        (27, ("Café", "Tea")),
+    ]
+    assert matcher.search(text)
+    assert not matcher.search("ünïcode only")
+    assert list(matcher.iter("ünïcode only")) == []
+    
+    # Overlapping matches are left to _find_matches_with_matcher()
+    matcher = pdf_text_replacer.HyperscanMatcher({"Company   A": "X", "ana": "Y"})
+    assert sorted(matcher.iter("banana company a")) == [
+        (3, ("ana", "Y")),
+        (5, ("ana", "Y")),
+        (15, ("Company   A", "X")),
+    ]
+
+
+@pytest.mark.parametrize("lines, expected", [
+    (["banana and 1111"], 2),
+    (["Company   A here"], 1),
+])
+def test_hyperscan_matches_per_key_search(tmp_path, monkeypatch, lines, expected):
+    if pdf_text_replacer.hyperscan is None:
+        pytest.skip("hyperscan is not installed")
+    monkeypatch.setattr(pdf_text_replacer, "ahocorasick", None)
+    replacements = pdf_text_replacer.sort_longest_first({"ana": "X", "11": "Z", "Company A": "Acme Inc"})
+    matcher = pdf_text_replacer.build_matcher(replacements)
+    assert isinstance(matcher, pdf_text_replacer.HyperscanMatcher)
+    
+    input_path = make_text_pdf(tmp_path / "input.pdf", lines)
+    expected_path = str(tmp_path / "expected.pdf")
+    output_path = str(tmp_path / "output.pdf")
+    assert pdf_text_replacer.replace_text_in_pdf(input_path, expected_path, replacements,
+                                                 matcher=pdf_text_replacer.KeyFilter(replacements)) == (True, expected)
+    assert pdf_text_replacer.replace_text_in_pdf(input_path, output_path, replacements,
+                                                 matcher=matcher) == (True, expected)
+    assert page_texts(output_path) == page_texts(expected_path)
+
+
+@pytest.mark.parametrize("cropbox", [None, (50, 50, 500, 700)], ids=["uncropped", "cropped"])
+def test_replacement_is_written_where_the_text_was(tmp_path, cropbox):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_text((72, 150), "Company A here", fontsize=12)
+    if cropbox:
+        page.set_cropbox(fitz.Rect(cropbox))
+    original = page.search_for("Company A")[0]
+    input_path = str(tmp_path / "input.pdf")
+    doc.save(input_path)
+    doc.close()
+    
+    output_path = str(tmp_path / "output.pdf")
+    assert pdf_text_replacer.replace_text_in_pdf(input_path, output_path, {"Company A": "Acme"}) == (True, 1)
+    
+    with fitz.open(output_path) as output:
+        replaced = output[0].search_for("Acme")
+    assert len(replaced) == 1
+    assert abs(replaced[0].y1 - original.y1) < 5
+    assert abs(replaced[0].x0 - original.x0) < 5
+
+
+def test_in_place_save_without_changes_is_incremental(tmp_path, caplog):
+    path = make_pdf(tmp_path / "input.pdf")
+    original = open(path, "rb").read()
+    
+    assert pdf_text_replacer.replace_text_in_pdf(path, path, {"Missing": "text"}, compact=True) == (True, 0)
+    assert open(path, "rb").read().startswith(original)
+    assert "compact output is not applied" in caplog.text
+
+
+def test_in_place_save_after_redaction_rewrites_the_file(tmp_path):
+    path = make_pdf(tmp_path / "input.pdf")
+    original = open(path, "rb").read()
+    
+    success, count = pdf_text_replacer.replace_text_in_pdf(path, path, REPLACEMENTS)
+    assert success and count > 0
+    # An incremental save would keep the redacted text in the earlier revision
+    assert not open(path, "rb").read().startswith(original)
+    assert "Acme Inc" in page_texts(path)[0]
+    assert list(tmp_path.iterdir()) == [tmp_path / "input.pdf"]
+
+
+def test_in_place_save_of_repaired_document(tmp_path):
+    path = make_pdf(tmp_path / "input.pdf")
+    data = open(path, "rb").read()
+    # Point startxref at the wrong offset, so the file is repaired on open
+    offset = data.rindex(b"startxref") + len(b"startxref")
+    open(path, "wb").write(data[:offset] + b"\n1\n%%EOF\n")
+    with fitz.open(path) as doc:
+        assert not doc.can_save_incrementally()
+        
+    assert pdf_text_replacer.replace_text_in_pdf(path, path, {"Missing": "text"}) == (True, 0)
+    with fitz.open(path) as doc:
+        assert not doc.is_repaired
+    assert list(tmp_path.iterdir()) == [tmp_path / "input.pdf"]
+
+
+def test_embedded_fonts_are_subset_without_compact(tmp_path):
+    doc = fitz.open()
+    page = doc.new_page()
+    page.insert_font(fontname="F0", fontbuffer=fitz.Font("helv").buffer)
+    page.insert_text((72, 72), "Company A here", fontname="F0")
+    input_path = str(tmp_path / "input.pdf")
+    doc.save(input_path)
+    doc.close()
+
+    output_path = str(tmp_path / "output.pdf")
+    assert pdf_text_replacer.replace_text_in_pdf(input_path, output_path, {"Company A": "Acme"}) == (True, 1)
+    assert os.path.getsize(output_path) < os.path.getsize(input_path)
+    assert "Acme" in page_texts(output_path)[0]
+
+
+def test_overlapping_keys_are_all_replaced(tmp_path, backend):
+    replacements = pdf_text_replacer.sort_longest_first({"ACME Corp": "X", "Corporation": "Y"})
+    input_path = make_text_pdf(tmp_path / "input.pdf", ["ACME Corporation"])
+    output_path = str(tmp_path / "output.pdf")
+    
+    assert pdf_text_replacer.replace_text_in_pdf(input_path, output_path, replacements) == (True, 2)
+    assert "oration" not in page_texts(output_path)[0]
+
+
+def test_key_filter_reports_overlapping_keys():
+    key_filter = pdf_text_replacer.KeyFilter({"ACME Corp": "X", "Corporation": "Y", "ACME": "Z"})
+    
+    assert key_filter.present("ACME Corporation") == [("Corporation", "Y"), ("ACME Corp", "X")]
+    assert key_filter.present("acme\nCORP") == [("ACME Corp", "X")]
+    assert key_filter.present("nothing here") == []
+    assert not pdf_text_replacer.KeyFilter({}).search("any text")
+
+
+def test_page_text_is_extracted_once(tmp_path, monkeypatch):
+    input_path = make_pdf(tmp_path / "input.pdf")
+    calls = []
+    get_text = fitz.Page.get_text
+    
+    def counting_get_text(page, option="text", *args, **kwargs):
+        calls.append((page.number, option))
+        return get_text(page, option, *args, **kwargs)
+        
+    monkeypatch.setattr(fitz.Page, "get_text", counting_get_text)
+    matcher = pdf_text_replacer.KeyFilter(REPLACEMENTS)
+    success, count = pdf_text_replacer.replace_text_in_pdf(
+        input_path, str(tmp_path / "output.pdf"), REPLACEMENTS, matcher=matcher)
+    
+    assert success and count > 0
+    assert [calls.count((number, "text")) for number in range(3)] == [1, 1, 1]
+
+
+def test_replacer_log_level_argument_is_ignored():
+    with pytest.warns(DeprecationWarning):
+        replacer = pdf_text_replacer.PDFTextReplacer("replacements.csv", "DEBUG")
+    assert replacer.compact is False
+    
+    assert pdf_text_replacer.PDFTextReplacer("replacements.csv", compact=True).compact is True
+    with pytest.raises(TypeError):
+        pdf_text_replacer.PDFTextReplacer("replacements.csv", None, True)
+
+
+def make_replacer(tmp_path):
+    """Return a PDFTextReplacer with REPLACEMENTS loaded from a CSV file"""
+    csv_path = tmp_path / "replacements.csv"
+    csv_path.write_text("from,to\n" + "".join(f"{key},{value}\n" for key, value in REPLACEMENTS.items()),
+                        encoding="utf-8")
+    replacer = pdf_text_replacer.PDFTextReplacer(str(csv_path))
+    assert replacer.load_csv_mappings()
+    return replacer
+
+
+def test_batch_in_worker_processes(tmp_path):
+    pdf_files = [make_pdf(tmp_path / f"input{number}.pdf") for number in range(3)]
+    pdf_files.append(str(tmp_path / "missing.pdf"))
+    output_dir = tmp_path / "output"
+    calls = []
+    
+    replacer = make_replacer(tmp_path)
+    replacer.process_multiple_pdfs(pdf_files, str(output_dir), workers=2,
+                                   progress_callback=lambda *args: calls.append(args))
+    
+    assert replacer.processed_files == 3
+    assert sorted(done for done, _, _, _ in calls) == [1, 2, 3, 4]
+    assert all(total == 4 for _, total, _, _ in calls)
+    assert sorted((pdf_file, success) for _, _, pdf_file, success in calls) == sorted(
+        [(pdf_file, True) for pdf_file in pdf_files[:3]] + [(pdf_files[3], False)])
+    for number in range(3):
+        texts = page_texts(output_dir / f"input{number}_replaced.pdf")
+        assert "Acme Inc" in texts[0] and "Company A" not in texts[0]
+    _, count = pdf_text_replacer.replace_text_in_pdf(pdf_files[0], str(tmp_path / "serial.pdf"), REPLACEMENTS)
+    assert replacer.total_replacements == 3 * count
+
+
+def crash_worker(job):
+    os._exit(1)
+
+
+def test_batch_records_crashed_workers_as_failed(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(pdf_text_replacer, "_replace_text_worker", crash_worker)
+    pdf_files = [make_pdf(tmp_path / f"input{number}.pdf") for number in range(2)]
+    calls = []
+    
+    replacer = make_replacer(tmp_path)
+    replacer.process_multiple_pdfs(pdf_files, str(tmp_path / "output"), workers=2,
+                                   progress_callback=lambda *args: calls.append(args))
+    
+    assert replacer.processed_files == 0
+    assert [success for _, _, _, success in calls] == [False, False]
+    assert "Files processed successfully: 0/2" in capsys.readouterr().out